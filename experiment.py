@@ -0,0 +1,373 @@
+'''
+Config-driven experiment runner.
+
+Usage:
+    python experiment.py run experiment.json [--fresh]
+    python experiment.py plot metrics.csv [--every N] [--output figure.png]
+
+The "run" step trains the players, saves a checkpoint, then plays the evaluation
+games and appends one row of cumulative results per game to the metrics file
+(.csv or .jsonl). If the job is killed it can be started again with the same
+command: training is skipped when the checkpoint exists and evaluation continues
+after the last game written to the metrics file. Next to the metrics file a
+.state file records which checkpoint the rows belong to and how many games
+are complete. The random state is saved with the checkpoint and after every
+game, so a seeded run gives the same results whether or not it was resumed.
+Use --fresh to start over.
+
+The "plot" step is separate, so matplotlib is only imported when plotting.
+
+Config keys:
+    game        "TicTacToe" or "Connect4"
+    players     two player specs, the first one moves first, e.g.
+                {"type": "MinMaxPlayer", "letter": "O", "depth": 2}
+                other keys are passed to the player constructor
+    train       number of training episodes for players that can be trained
+    num_games   number of evaluation games
+    metrics     path of the metrics file (default "metrics.csv")
+    checkpoint  path of the checkpoint file (default "checkpoint.pkl")
+    seed        optional random seed
+'''
+
+import argparse
+import csv
+import json
+import os
+import pickle
+import sys
+import time
+
+
+GAMES = ("TicTacToe", "Connect4")
+
+# Config keys that change the trained players, a checkpoint is only reused if
+# these are the same
+TRAINING_KEYS = ("game", "players", "train", "seed")
+
+# Name of the constructor argument each player type uses for the game name
+PLAYER_GAME_ARG = {
+    "RandomPlayer": None,
+    "MinMaxPlayer": "game_name",
+    "QLearningPlayer": "game_name",
+    "DefaultOpponent": "game_type",
+}
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+
+    if config.get("game") not in GAMES:
+        raise ValueError("game must be TicTacToe or Connect4")
+    players = config.get("players")
+    if not isinstance(players, list) or len(players) != 2:
+        raise ValueError("players must be a list of two player specs")
+    for spec in players:
+        if not isinstance(spec, dict):
+            raise ValueError("every player spec must be a JSON object")
+        if spec.get("type") not in PLAYER_GAME_ARG:
+            raise ValueError(
+                f"player type must be one of {', '.join(PLAYER_GAME_ARG)}")
+        if "letter" not in spec:
+            raise ValueError("every player needs a letter")
+        if spec["type"] == "DefaultOpponent" and "adversary_letter" not in spec:
+            raise ValueError("DefaultOpponent needs an adversary_letter")
+    if players[0]["letter"] == players[1]["letter"]:
+        raise ValueError("players must use different letters")
+
+    config.setdefault("train", 0)
+    config.setdefault("num_games", 1000)
+    for key in ("train", "num_games"):
+        value = config[key]
+        # bool is a subclass of int, but true/false is not a count
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{key} must be a non-negative integer")
+    config.setdefault("metrics", "metrics.csv")
+    config.setdefault("checkpoint", "checkpoint.pkl")
+    config.setdefault("seed", None)
+    return config
+
+
+def new_game(game_name):
+    import games
+    return getattr(games, game_name)()
+
+
+def make_player(spec, game_name):
+    import players
+
+    kwargs = {k: v for k, v in spec.items() if k != "type"}
+    game_arg = PLAYER_GAME_ARG[spec["type"]]
+    if game_arg is not None:
+        kwargs[game_arg] = game_name
+    return getattr(players, spec["type"])(**kwargs)
+
+
+def save_checkpoint(path, data):
+    # Write to a temporary file first so a kill never leaves a broken checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def training_config(config):
+    return {key: config[key] for key in TRAINING_KEYS}
+
+
+def load_checkpoint(path, config):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    if data["config"] != training_config(config):
+        raise ValueError(
+            f"checkpoint {path} was made with a different config, use --fresh")
+    return data
+
+
+def train_players(config):
+    players = [make_player(spec, config["game"]) for spec in config["players"]]
+    if config["train"] > 0:
+        for player in players:
+            if hasattr(player, "train"):
+                player.train(config["train"])
+    return players
+
+
+def metrics_fields(letters):
+    return (["game"] + [f"{l}_wins" for l in letters] + ["ties"]
+            + [f"{l}_win_rate" for l in letters] + ["tie_rate"])
+
+
+def is_jsonl(path):
+    return path.endswith(".jsonl")
+
+
+def read_metrics(path):
+    '''
+    Yield the rows of a metrics file one at a time as dicts of floats.
+    '''
+    with open(path, newline="") as f:
+        if is_jsonl(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield {k: float(v) for k, v in row.items()}
+
+
+def state_path(config):
+    return config["metrics"] + ".state"
+
+
+def metrics_offset(path, games):
+    '''
+    Return the byte offset just after the header and the first `games` rows
+    of a metrics file, or None if the file has fewer complete rows.
+    '''
+    lines = games if is_jsonl(path) else games + 1
+    if games == 0:
+        return 0
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            lines -= 1
+            if lines == 0:
+                return offset
+    return None
+
+
+def resume_metrics(config, run_id, letters):
+    '''
+    Cut the metrics file back to the last game recorded in its state file,
+    restore the random state saved with that game and return
+    (games played, wins per letter, ties) at that point.
+    '''
+    import random
+
+    wins = {l: 0 for l in letters}
+    ties = 0
+    played = 0
+    path = config["metrics"]
+    if not os.path.exists(path):
+        return played, wins, ties
+
+    # Without a state file the job was killed before the first game was
+    # recorded, so start over from the random state of the checkpoint. Metrics
+    # left without a checkpoint are already refused in run_experiment.
+    if os.path.exists(state_path(config)):
+        with open(state_path(config), "rb") as f:
+            state = pickle.load(f)
+        if state["run_id"] != run_id:
+            raise ValueError(
+                f"metrics file {path} was written by other players than "
+                f"checkpoint {config['checkpoint']}, use --fresh")
+        played = state["game"]
+        random.setstate(state["random_state"])
+
+    offset = metrics_offset(path, played)
+    if offset is None:
+        raise ValueError(
+            f"metrics file {path} has fewer than {played} games, use --fresh")
+    # Drops rows written after the state file and any half written line
+    with open(path, "rb+") as f:
+        f.truncate(offset)
+
+    if played:
+        for row in read_metrics(path):
+            last = row
+        wins = {l: int(last[f"{l}_wins"]) for l in letters}
+        ties = int(last["ties"])
+    return played, wins, ties
+
+
+def evaluate(config, players, run_id):
+    import random
+    from run import play
+
+    letters = [p.letter for p in players]
+    fields = metrics_fields(letters)
+    path = config["metrics"]
+    played, wins, ties = resume_metrics(config, run_id, letters)
+    if played > config["num_games"]:
+        print(f"Warning: {path} already has {played} games, "
+              f"more than num_games={config['num_games']}")
+    elif played:
+        print(f"Resuming evaluation after game {played}")
+
+    write_header = not is_jsonl(path) and (
+        not os.path.exists(path) or os.path.getsize(path) == 0)
+    with open(path, "a", newline="") as f:
+        writer = None if is_jsonl(path) else csv.writer(f)
+        if write_header:
+            writer.writerow(fields)
+
+        for i in range(played + 1, config["num_games"] + 1):
+            t = new_game(config["game"])
+            play(t, players[0], players[1], print_game=False)
+
+            if t.current_winner in wins:
+                wins[t.current_winner] += 1
+            else:
+                ties += 1
+
+            values = ([i] + [wins[l] for l in letters] + [ties]
+                      + [wins[l] / i for l in letters] + [ties / i])
+            if writer is None:
+                f.write(json.dumps(dict(zip(fields, values))) + "\n")
+            else:
+                writer.writerow(values)
+            f.flush()
+            save_checkpoint(state_path(config), {
+                "run_id": run_id, "game": i, "random_state": random.getstate()})
+            played = i
+
+    return played, wins, ties
+
+
+def run_experiment(config, fresh=False):
+    import random
+    import uuid
+
+    if fresh:
+        for path in (config["checkpoint"], config["metrics"],
+                     state_path(config)):
+            if os.path.exists(path):
+                os.remove(path)
+    start_time = time.time()
+    checkpoint = load_checkpoint(config["checkpoint"], config)
+    if checkpoint is None:
+        # New players must not be added to the results of old ones
+        for path in (config["metrics"], state_path(config)):
+            if os.path.exists(path):
+                raise ValueError(
+                    f"{path} belongs to an earlier run but there is no "
+                    f"checkpoint {config['checkpoint']}, use --fresh")
+        if config["seed"] is not None:
+            random.seed(config["seed"])
+        players = train_players(config)
+        checkpoint = {"config": training_config(config), "players": players,
+                      "run_id": uuid.uuid4().hex,
+                      "random_state": random.getstate()}
+        save_checkpoint(config["checkpoint"], checkpoint)
+    else:
+        print(f"Loaded trained players from {config['checkpoint']}")
+        players = checkpoint["players"]
+        random.setstate(checkpoint["random_state"])
+
+    num_games, wins, ties = evaluate(config, players, checkpoint["run_id"])
+    total_time = time.time() - start_time
+
+    print(f"Number of games played: {num_games}")
+    print(f"Execution time: {total_time:.2f}s")
+    if num_games == 0:
+        return
+    for letter, count in wins.items():
+        print(f"{letter} player win rate: {count/num_games:.2f}")
+    print(f"Tie rate: {ties/num_games:.2f}")
+
+
+def plot_metrics(path, every=1, output=None):
+    import matplotlib
+    if output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # Only every N-th game is kept, so long runs can be plotted with less memory
+    games = []
+    series = {}
+    for row in read_metrics(path):
+        if int(row["game"]) % every:
+            continue
+        games.append(row["game"])
+        for key, value in row.items():
+            if key.endswith("_rate"):
+                series.setdefault(key, []).append(value)
+
+    for key, values in series.items():
+        if key == "tie_rate":
+            label = "Tie rate"
+        else:
+            label = f"{key[:-len('_win_rate')]} player win rate"
+        plt.plot(games, values, label=label)
+    plt.xlabel("Number of games")
+    plt.ylabel("Win/Tie rate")
+    plt.legend()
+    if output:
+        plt.savefig(output)
+    else:
+        plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run", help="train and evaluate the players of an experiment config")
+    run_parser.add_argument("config", help="path of the JSON config")
+    run_parser.add_argument("--fresh", action="store_true",
+                            help="remove existing checkpoint and metrics")
+
+    plot_parser = commands.add_parser("plot", help="plot a metrics file")
+    plot_parser.add_argument("metrics", help="path of the .csv or .jsonl file")
+    plot_parser.add_argument("--every", type=int, default=1,
+                             help="plot only every N-th game")
+    plot_parser.add_argument("--output", help="save the figure to this file")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run_experiment(load_config(args.config), fresh=args.fresh)
+    else:
+        if args.every < 1:
+            parser.error("--every must be at least 1")
+        plot_metrics(args.metrics, every=args.every, output=args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
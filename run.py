@@ -1,5 +1,4 @@
 import time
-import matplotlib.pyplot as plt
 from games import TicTacToe, Connect4
 from players import RandomPlayer, MinMaxPlayer, QLearningPlayer, DefaultOpponent
 
@@ -34,6 +33,8 @@ def play(game, x_player, o_player, print_game=True):
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     game = "TicTacToe"
     game = "Connect4"
     r_player = RandomPlayer("R")
@@ -0,0 +1,153 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from experiment import load_config, main, run_experiment
+
+
+def write_config(tmp_path, metrics="metrics.csv", **overrides):
+    config = {
+        "game": "TicTacToe",
+        "players": [
+            {"type": "RandomPlayer", "letter": "X"},
+            {"type": "QLearningPlayer", "letter": "Q"},
+        ],
+        "train": 50,
+        "num_games": 20,
+        "metrics": str(tmp_path / metrics),
+        "checkpoint": str(tmp_path / "checkpoint.pkl"),
+        "seed": 1,
+    }
+    config.update(overrides)
+    path = tmp_path / "experiment.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def run(config_path, fresh=False):
+    run_experiment(load_config(config_path), fresh=fresh)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("metrics", ["metrics.csv", "metrics.jsonl"])
+def test_resume_after_truncated_line(tmp_path, metrics):
+    run(write_config(tmp_path, metrics))
+    expected = read(tmp_path / metrics)
+
+    run(write_config(tmp_path, metrics, num_games=8), fresh=True)
+    with open(tmp_path / metrics, "a") as f:
+        f.write('{"game": 9, "X_w' if metrics.endswith(".jsonl") else "9,4,")
+    run(write_config(tmp_path, metrics))
+
+    assert read(tmp_path / metrics) == expected
+
+
+def test_resume_from_partial_header(tmp_path):
+    run(write_config(tmp_path, num_games=5))
+    expected = read(tmp_path / "metrics.csv")
+
+    run(write_config(tmp_path, num_games=0), fresh=True)
+    (tmp_path / "metrics.csv").write_text("game,X_w")
+    run(write_config(tmp_path, num_games=5))
+
+    assert read(tmp_path / "metrics.csv") == expected
+
+
+def test_resume_without_state_file(tmp_path):
+    run(write_config(tmp_path, num_games=3))
+    expected = read(tmp_path / "metrics.csv")
+
+    # Killed after the first row was written but before its state was saved
+    run(write_config(tmp_path, num_games=1), fresh=True)
+    os.remove(tmp_path / "metrics.csv.state")
+    run(write_config(tmp_path, num_games=3))
+
+    assert read(tmp_path / "metrics.csv") == expected
+
+
+@pytest.mark.parametrize("overrides", [
+    {"players": ["RandomPlayer", {"type": "RandomPlayer", "letter": "Q"}]},
+    {"players": [{"type": "DefaultOpponent", "letter": "X"},
+                 {"type": "RandomPlayer", "letter": "Q"}]},
+    {"train": 1.5},
+    {"train": True},
+    {"num_games": -1},
+])
+def test_invalid_config(tmp_path, overrides):
+    with pytest.raises(ValueError):
+        load_config(write_config(tmp_path, **overrides))
+
+
+def test_checkpoint_config_mismatch(tmp_path):
+    run(write_config(tmp_path))
+    with pytest.raises(ValueError):
+        run(write_config(tmp_path, train=60))
+
+
+def test_old_metrics_without_checkpoint(tmp_path):
+    run(write_config(tmp_path))
+    os.remove(tmp_path / "checkpoint.pkl")
+    with pytest.raises(ValueError):
+        run(write_config(tmp_path))
+
+
+def test_summary_uses_recorded_games(tmp_path, capsys):
+    run(write_config(tmp_path))
+    capsys.readouterr()
+    run(write_config(tmp_path, num_games=10))
+
+    out = capsys.readouterr().out
+    assert "Number of games played: 20" in out
+    rates = [float(line.rsplit(" ", 1)[1]) for line in out.splitlines()
+             if "rate:" in line]
+    assert sum(rates) == pytest.approx(1, abs=0.02)
+
+
+def test_fresh_removes_checkpoint_and_metrics(tmp_path):
+    config_path = write_config(tmp_path)
+    run(config_path)
+    with open(tmp_path / "checkpoint.pkl", "rb") as f:
+        old_run_id = pickle.load(f)["run_id"]
+
+    main(["run", write_config(tmp_path, num_games=0), "--fresh"])
+
+    with open(tmp_path / "checkpoint.pkl", "rb") as f:
+        assert pickle.load(f)["run_id"] != old_run_id
+    assert read(tmp_path / "metrics.csv").count("\n") == 1
+    assert not os.path.exists(tmp_path / "metrics.csv.state")
+
+
+def test_run_does_not_import_matplotlib(tmp_path):
+    # Run in a new interpreter so modules imported by other tests don't count
+    script = ("import sys, experiment; experiment.main(['run', sys.argv[1]]); "
+              "assert 'matplotlib' not in sys.modules")
+    subprocess.run(
+        [sys.executable, "-c", script, write_config(tmp_path, num_games=2)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+@pytest.mark.parametrize("metrics", ["metrics.csv", "metrics.jsonl"])
+def test_plot(tmp_path, metrics):
+    pytest.importorskip("matplotlib")
+    import matplotlib.pyplot as plt
+
+    run(write_config(tmp_path, metrics, num_games=6))
+    plt.close("all")
+    output = tmp_path / "f.png"
+    main(["plot", str(tmp_path / metrics), "--every", "2",
+          "--output", str(output)])
+
+    assert output.stat().st_size > 0
+    lines = plt.gca().get_lines()
+    assert [line.get_label() for line in lines] == [
+        "X player win rate", "Q player win rate", "Tie rate"]
+    assert list(lines[0].get_xdata()) == [2, 4, 6]
+    plt.close("all")